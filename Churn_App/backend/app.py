@@ -1,12 +1,49 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import orjson
 import joblib
 import pandas as pd
 import os
 import json
+import shutil
+import tempfile
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from itertools import chain
 import shap
+import numpy as np
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (also encodes NumPy arrays/scalars)"""
+
+    @staticmethod
+    def default(o):
+        # orjson hands non-contiguous arrays (e.g. per-class SHAP slices) back to us
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 # ----------------------
@@ -35,21 +72,200 @@ if not os.path.exists(DATA_PATH):
         f"❌ {DATA_PATH} not found. Please place Telco_Cust_Churn.csv in backend/."
     )
 
-df = pd.read_csv(DATA_PATH)
+df = pd.read_csv(DATA_PATH, engine="pyarrow")  # multi-threaded parser
 df.columns = df.columns.str.strip()
+df["TotalCharges"] = pd.to_numeric(df["TotalCharges"], errors="coerce")
 df["Churn"] = df["Churn"].map({"Yes": 1, "No": 0})
 
+# ----------------------
+# Precompute dashboard aggregates
+# ----------------------
+def _bucket_rates(column, bins, labels):
+    """Churn rate per right-inclusive bucket of a numeric column"""
+    buckets = pd.cut(df[column], bins=bins, labels=labels)
+    return df.groupby(buckets, observed=True)["Churn"].mean().to_dict()
+
+
+_DASH = {
+    "contract": df.groupby("Contract")["Churn"].mean().to_dict(),
+    "tenure": _bucket_rates(
+        "tenure", [-np.inf, 12, 24, np.inf], ["0-12", "13-24", "25+"]
+    ),
+    "monthly": _bucket_rates(
+        "MonthlyCharges", [-np.inf, 50, 100, np.inf], ["0-50", "51-100", "101+"]
+    )
+}
+
+# ----------------------
+# Cached metrics.json
+# ----------------------
+_metrics_cache = {"mtime": None, "data": {}}
+
+
+def _load_metrics():
+    """Return parsed metrics.json, re-reading it only when its mtime changes"""
+    try:
+        mtime = os.stat(METRICS_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    if mtime != _metrics_cache["mtime"]:
+        with open(METRICS_PATH, "r") as f:
+            _metrics_cache["data"] = json.load(f)
+        _metrics_cache["mtime"] = mtime
+
+    return _metrics_cache["data"]
+
+# ----------------------
+# Build SHAP explainer once
+# ----------------------
+def _to_dense(X):
+    """Densify (possibly sparse) preprocessor output for SHAP, which wants plain arrays"""
+    return X.toarray() if sparse.issparse(X) else np.asarray(X)
+
+
+def _memoized_predict():
+    """Churn probability function with a memo scoped to one explanation.
+
+    The model-agnostic explainer evaluates many coalitions that produce identical
+    masked rows (within a row and across rows of a batch), so only unseen rows
+    are sent to the classifier, in a single predict_proba call. The memo is
+    dropped with the explanation, so workers don't hold a long-lived cache.
+    """
+    memo = {}  # masked row bytes -> churn probability
+
+    def predict(X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        keys = [row.tobytes() for row in X]
+
+        missing = {}
+        for i, k in enumerate(keys):
+            if k not in memo:
+                missing.setdefault(k, i)
+
+        if missing:
+            probs = model.named_steps["clf"].predict_proba(X[list(missing.values())])[:, 1]
+            memo.update(zip(missing, probs.tolist()))
+
+        return np.array([memo[k] for k in keys])
+
+    return predict
+
+
+TREE_MODELS = (RandomForestClassifier, HistGradientBoostingClassifier, XGBClassifier)
+
+
+def _build_explainer():
+    """Build the fastest exact SHAP explainer available for the active classifier"""
+    clf = model.named_steps["clf"]
+    background = model.named_steps["pre"].transform(
+        df.sample(min(100, len(df)), random_state=0)
+    )
+
+    try:
+        if isinstance(clf, TREE_MODELS):
+            # Path-dependent TreeSHAP: polynomial time, no background data needed
+            return shap.TreeExplainer(clf, feature_perturbation="tree_path_dependent")
+        if isinstance(clf, LogisticRegression):
+            return shap.LinearExplainer(clf, background)
+    except Exception as e:
+        print("⚠️ Specialized SHAP explainer failed:", e)
+
+    print("⚠️ Falling back to model-agnostic SHAP explainer.")
+    masker = shap.maskers.Independent(_to_dense(background))
+
+    def explain_with_memo(X):
+        # Wrapping a function is cheap; a fresh memo per call keeps requests independent
+        return shap.Explainer(_memoized_predict(), masker)(X)
+
+    return explain_with_memo
+
+
+def _explain(X_transformed):
+    """Churn-class SHAP values for preprocessed rows"""
+    shap_values = _explainer(_to_dense(X_transformed))
+
+    # Some explainers return one output per class
+    if shap_values.values.ndim == 3:
+        return shap_values[..., 1]
+    return shap_values
+
+
+_explainer = _build_explainer()
+print("✅ SHAP explainer ready.")
+
+# ----------------------
+# Micro-batching for /api/predict
+# ----------------------
+MICRO_BATCH = os.environ.get("MICRO_BATCH", "1") == "1"  # set to 0 for the synchronous path
+BATCH_MAX_ROWS = 64
+BATCH_MAX_WAIT = 0.005  # seconds
+INPUT_COLUMNS = list(model.named_steps["pre"].feature_names_in_)
+
+_predict_queue = queue.Queue()
+_batcher_lock = threading.Lock()
+_batcher = {"pid": None}
+
+
+def _predict_batches():
+    """Drain queued single-row requests and score them with one predict_proba call"""
+    while True:
+        items = [_predict_queue.get()]
+
+        # Only wait for more rows when others are already queued (i.e. under load)
+        if not _predict_queue.empty():
+            deadline = time.monotonic() + BATCH_MAX_WAIT
+            while len(items) < BATCH_MAX_ROWS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(_predict_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+        try:
+            df_batch = pd.DataFrame([row for row, _ in items], columns=INPUT_COLUMNS)
+            probs = model.predict_proba(df_batch)[:, 1]
+            for (_, future), prob in zip(items, probs):
+                future.set_result(float(prob))
+        except Exception:
+            # Score rows one by one so a malformed payload only fails its own request
+            for row, future in items:
+                try:
+                    future.set_result(float(model.predict_proba(pd.DataFrame([row]))[0, 1]))
+                except Exception as e:
+                    future.set_exception(e)
+
+
+def _predict_batched(data):
+    """Queue one customer for the batcher thread and wait for its churn probability"""
+    # A batch frame fills absent keys with NaN, so reject incomplete rows up front
+    # exactly as the single-row pipeline would
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object with customer fields")
+    missing = set(INPUT_COLUMNS) - set(data)
+    if missing:
+        raise ValueError(f"columns are missing: {missing}")
+
+    # Threads do not survive fork, so each (Gunicorn worker) process starts its own
+    if _batcher["pid"] != os.getpid():
+        with _batcher_lock:
+            if _batcher["pid"] != os.getpid():
+                threading.Thread(target=_predict_batches, daemon=True).start()
+                _batcher["pid"] = os.getpid()
+
+    future = Future()
+    _predict_queue.put((data, future))
+    return future.result()
+
 # ----------------------
 # Routes
 # ----------------------
 @app.route("/api/health", methods=["GET"])
 def health():
     """Simple health check"""
-    active_model = None
-    if os.path.exists(METRICS_PATH):
-        with open(METRICS_PATH, "r") as f:
-            metrics = json.load(f)
-            active_model = metrics.get("current_model")
+    active_model = _load_metrics().get("current_model")
 
     return jsonify({
         "status": "ok",
@@ -63,13 +279,14 @@ def predict():
     """Run churn prediction for a single customer"""
     try:
         data = request.json
-        df_input = pd.DataFrame([data])
 
-        pred = model.predict(df_input)[0]
-        prob = model.predict_proba(df_input)[0][1]
+        if MICRO_BATCH:
+            prob = _predict_batched(data)
+        else:
+            prob = model.predict_proba(pd.DataFrame([data]))[0, 1]
 
         return jsonify({
-            "prediction": int(pred),
+            "prediction": int(prob >= 0.5),
             "probability": float(prob)
         })
     except Exception as e:
@@ -79,64 +296,21 @@ def predict():
 @app.route("/api/dashboard", methods=["GET"])
 def dashboard():
     """Return churn distributions + model metrics"""
+    metrics = _load_metrics()
+    active_model = metrics.get("current_model")
 
-    # ---- Contract ----
-    contract_rates = df.groupby("Contract")["Churn"].mean().to_dict()
-
-    # ---- Tenure buckets ----
-    def tenure_bucket(t):
-        if t <= 12:
-            return "0-12"
-        elif t <= 24:
-            return "13-24"
-        else:
-            return "25+"
-
-    df["TenureBucket"] = df["tenure"].apply(tenure_bucket)
-    tenure_rates = df.groupby("TenureBucket")["Churn"].mean().to_dict()
-
-    # ---- Monthly charges buckets ----
-    def monthly_bucket(m):
-        if m <= 50:
-            return "0-50"
-        elif m <= 100:
-            return "51-100"
-        else:
-            return "101+"
-
-    df["MonthlyBucket"] = df["MonthlyCharges"].apply(monthly_bucket)
-    monthly_rates = df.groupby("MonthlyBucket")["Churn"].mean().to_dict()
-
-    # ---- Load model metrics ----
-    metrics = {}
-    active_model = None
-    if os.path.exists(METRICS_PATH):
-        with open(METRICS_PATH, "r") as f:
-            metrics = json.load(f)
-            active_model = metrics.get("current_model")
-
-    return jsonify({
-        "contract": contract_rates,
-        "tenure": tenure_rates,
-        "monthly": monthly_rates,
-        "metrics": metrics,
-        "active_model": active_model
-    })
+    return jsonify({**_DASH, "metrics": metrics, "active_model": active_model})
 
 
 @app.route("/api/feature-importance", methods=["GET"])
 def feature_importance():
     """Return feature importance for the active model"""
     feature_importance = {}
-    active_model = None
-
-    if os.path.exists(METRICS_PATH):
-        with open(METRICS_PATH, "r") as f:
-            metrics = json.load(f)
-            active_model = metrics.get("current_model")
+    metrics = _load_metrics()
+    active_model = metrics.get("current_model")
 
-            if active_model and active_model in metrics:
-                feature_importance = metrics[active_model].get("feature_importance", {})
+    if active_model and active_model in metrics:
+        feature_importance = metrics[active_model].get("feature_importance", {})
 
     return jsonify({
         "active_model": active_model,
@@ -146,83 +320,154 @@ def feature_importance():
 
 @app.route("/api/explain", methods=["POST"])
 def explain():
-    """Explain prediction for a single customer using SHAP"""
+    """Explain predictions for one customer (object) or many customers (list) using SHAP"""
     try:
         data = request.json
-        df_input = pd.DataFrame([data])
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return jsonify([])
+        df_input = pd.DataFrame(rows)
 
-        # Apply preprocessing before SHAP
+        # Apply preprocessing once and explain all rows in a single SHAP call
         X_transformed = model.named_steps["pre"].transform(df_input)
-        clf = model.named_steps["clf"]
+        shap_values = _explain(X_transformed)
+
+        explanations = [
+            {
+                "features": features,
+                "shap_values": shap_values.values[i],
+                "base_value": float(shap_values.base_values[i])
+            }
+            for i, features in enumerate(df_input.to_dict(orient="records"))
+        ]
+
+        return jsonify(explanations if isinstance(data, list) else explanations[0])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Use SHAP explainer for tree/linear models
-        explainer = shap.Explainer(clf, X_transformed)
-        shap_values = explainer(X_transformed)
 
-        explanation = {
+@app.route("/api/predict-explain", methods=["POST"])
+def predict_explain():
+    """Predict churn for a single customer and explain it with SHAP in one pass"""
+    try:
+        data = request.json
+        df_input = pd.DataFrame([data])
+
+        # Preprocess once for both the classifier and the explainer
+        X_transformed = model.named_steps["pre"].transform(df_input)
+        prob = model.named_steps["clf"].predict_proba(X_transformed)[0, 1]
+        shap_values = _explain(X_transformed)
+
+        return jsonify({
+            "prediction": int(prob >= 0.5),
+            "probability": float(prob),
             "features": df_input.to_dict(orient="records")[0],
-            "shap_values": shap_values.values[0].tolist(),
+            "shap_values": shap_values.values[0],
             "base_value": float(shap_values.base_values[0])
-        }
-
-        return jsonify(explanation)
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
-@app.route("/api/batch-predict", methods=["POST"])
-def batch_predict():
-    """Run predictions for multiple customers via CSV upload and summarize with SHAP"""
-    try:
-        if "file" not in request.files:
-            return jsonify({"error": "No file uploaded"}), 400
+BATCH_CHUNK_ROWS = 10_000
 
-        file = request.files["file"]
-        print("📂 Received file:", file.filename)
 
-        # ---- Load input CSV ----
-        df_input = pd.read_csv(file)
-        df_input.columns = df_input.columns.str.strip()
+def _score_chunk(chunk):
+    """Return a CSV chunk with prediction + probability columns"""
+    probs = model.predict_proba(chunk)[:, 1]
+    results = chunk.copy()
+    results["prediction"] = (probs >= 0.5).astype(int).tolist()
+    results["probability"] = probs.tolist()
+    return results
 
-        if df_input.empty:
-            return jsonify({"error": "Uploaded CSV is empty"}), 400
 
-        # ---- Predictions ----
-        preds = model.predict(df_input).tolist()
-        probs = model.predict_proba(df_input)[:, 1].tolist()
+def _shap_abs_sum(chunk):
+    """Sum of absolute SHAP values per transformed feature over a CSV chunk"""
+    X_transformed = model.named_steps["pre"].transform(chunk)
+    shap_values = _explain(X_transformed)
+    return np.abs(shap_values.values).sum(axis=0)
 
-        results = df_input.copy()
-        results["prediction"] = preds
-        results["probability"] = probs
 
-        # ---- SHAP batch explanation ----
-        feature_importance = {}
-        try:
-            X_transformed = model.named_steps["pre"].transform(df_input)
-            clf = model.named_steps["clf"]
+@app.route("/api/batch-predict", methods=["POST"])
+def batch_predict():
+    """Run predictions for multiple customers via CSV upload and summarize with SHAP"""
+    if "file" not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
 
-            # Initialize SHAP explainer (safe for tree/linear models)
-            explainer = shap.Explainer(clf, X_transformed)
-            shap_values = explainer(X_transformed)
+    file = request.files["file"]
+    print("📂 Received file:", file.filename)
 
-            # Mean absolute SHAP values across all rows in batch
-            mean_abs_shap = shap_values.abs.mean(0).tolist()
-            feature_names = model.named_steps["pre"].get_feature_names_out()
+    # Werkzeug closes the upload when the view returns, so the streamed chunks
+    # are read from an on-disk copy we own (closed at the end of generate())
+    upload = tempfile.TemporaryFile()
+    try:
+        shutil.copyfileobj(file.stream, upload)
+        upload.seek(0)
 
-            feature_importance = dict(zip(feature_names, mean_abs_shap))
-        except Exception as shap_err:
-            print("⚠️ SHAP explanation failed:", shap_err)
+        # ---- Read input CSV in chunks ----
+        reader = pd.read_csv(upload, chunksize=BATCH_CHUNK_ROWS)
+        first_chunk = next(reader, None)
 
-        # ---- Response ----
-        return jsonify({
-            "predictions": results.to_dict(orient="records"),  # ✅ proper JSON
-            "batch_feature_importance": feature_importance
-        })
+        if first_chunk is None or first_chunk.empty:
+            upload.close()
+            return jsonify({"error": "Uploaded CSV is empty"}), 400
+
+        # Score the first chunk up front so bad input still gets a 400
+        first_chunk.columns = first_chunk.columns.str.strip()
+        first_results = _score_chunk(first_chunk)
 
     except Exception as e:
+        upload.close()
         print("❌ Batch prediction error:", str(e))
         return jsonify({"error": str(e)}), 400
 
+    @stream_with_context
+    def generate():
+        shap_sum = 0
+        shap_rows = 0
+        shap_failed = False
+        error = None
+
+        yield '{"predictions": ['
+        try:
+            for i, chunk in enumerate(chain([first_chunk], reader)):
+                # ---- Predictions ----
+                if i:
+                    chunk.columns = chunk.columns.str.strip()
+                results = first_results if i == 0 else _score_chunk(chunk)
+                # to_json writes records straight from the frame, no list[dict] in between
+                yield ("," if i else "") + results.to_json(orient="records")[1:-1]
+
+                # ---- SHAP: running sum of |values| across chunks ----
+                if not shap_failed:
+                    try:
+                        shap_sum = shap_sum + _shap_abs_sum(chunk)
+                        shap_rows += len(chunk)
+                    except Exception as shap_err:
+                        print("⚠️ SHAP explanation failed:", shap_err)
+                        shap_failed = True
+        except Exception as e:
+            print("❌ Batch prediction error:", str(e))
+            error = str(e)
+        finally:
+            upload.close()
+
+        # Mean absolute SHAP values across all rows in batch
+        feature_importance = {}
+        if shap_rows and not shap_failed:
+            feature_names = model.named_steps["pre"].get_feature_names_out()
+            feature_importance = dict(zip(feature_names, shap_sum / shap_rows))
+
+        tail = {"batch_feature_importance": feature_importance}
+        if error is not None:
+            # Headers are already sent, so flag the truncated result in the body
+            tail["error"] = error
+        yield '], ' + app.json.dumps(tail)[1:]
+
+    # ---- Response (streamed, same shape as before) ----
+    return Response(generate(), mimetype="application/json")
+
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
+    # Local dev only; use `gunicorn app:app` (gunicorn.conf.py) for anything else
+    app.run(port=5000, debug=False, use_reloader=False, threaded=True)
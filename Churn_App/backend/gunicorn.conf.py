@@ -0,0 +1,30 @@
+import gc
+import os
+
+# ----------------------
+# Gunicorn settings (run with: gunicorn app:app)
+# ----------------------
+bind = "0.0.0.0:5000"
+
+# SHAP/NumPy calls are CPU-bound, so scale with processes, not threads
+workers = 2 * (os.cpu_count() or 1) + 1
+
+# A few threads per worker let concurrent /api/predict calls share a micro-batch
+threads = 4
+
+# SHAP explanations of large batches can take a while
+timeout = 120
+
+# Load model.pkl, the dashboard data and the SHAP explainer once in the master;
+# forked workers share those pages copy-on-write as long as app.py keeps them
+# read-only inside request handlers
+preload_app = True
+
+
+def when_ready(server):
+    """Move preloaded objects out of GC tracking before workers are forked.
+
+    Collections in a worker would otherwise write to the headers of every
+    tracked object and un-share the pages holding the model and data.
+    """
+    gc.freeze()
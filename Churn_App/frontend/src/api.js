@@ -14,6 +14,11 @@ export function explain(payload) {
   return axios.post(`${API_BASE}/api/explain`, payload);
 }
 
+// Prediction + SHAP explanation in a single request
+export function predictExplain(payload) {
+  return axios.post(`${API_BASE}/api/predict-explain`, payload);
+}
+
 // Batch prediction via CSV upload
 export function batchPredict(file) {
   const formData = new FormData();
@@ -1,5 +1,5 @@
 import React, { useState } from "react";
-import { predict, explain, batchPredict } from "../api";
+import { predictExplain, batchPredict } from "../api";
 
 export default function PredictionForm({ onResult, onExplain, onBatchResult }) {
   const [form, setForm] = useState({
@@ -49,13 +49,11 @@ export default function PredictionForm({ onResult, onExplain, onBatchResult }) {
     };
 
     try {
-      // 1️⃣ Predict churn
-      const res = await predict(payload);
-      onResult(res.data);
-
-      // 2️⃣ Get SHAP explanation
-      const exp = await explain(payload);
-      onExplain(exp.data);
+      // Predict churn + get SHAP explanation in one call
+      const res = await predictExplain(payload);
+      const { prediction, probability, ...explanation } = res.data;
+      onResult({ prediction, probability });
+      onExplain(explanation);
     } catch (err) {
       console.error("❌ API error:", err.response ? err.response.data : err.message);
       alert("Prediction or explanation failed. Check backend connection.");